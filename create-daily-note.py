@@ -1,10 +1,15 @@
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 import os
 from pathlib import Path
 import locale
 from dotenv import load_dotenv
 import requests
-from typing import List, Dict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
+import sqlite3
+from rapidfuzz import fuzz
+from typing import List, Dict, Optional
 import re
 from termcolor import colored
 from google.oauth2.credentials import Credentials
@@ -12,55 +17,92 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 import argparse
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 import uuid
-import difflib
+import functools
+import logging
+import operator
+import sys
 
 # Load environment variables
 load_dotenv()
 
+# Read settings once at startup
+TODOIST_API_KEY = os.getenv('TODOIST_API_KEY')
+TODOIST_WORK_PROJECT = os.getenv('TODOIST_WORK_PROJECT', 'todo')
+TODOIST_PERSONAL_PROJECT = os.getenv('TODOIST_PERSONAL_PROJECT', 'todo')
+GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
+GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
+GOOGLE_REFRESH_TOKEN = os.getenv('GOOGLE_REFRESH_TOKEN')
+GOOGLE_CALENDAR_SYNC_DAYS = os.getenv('GOOGLE_CALENDAR_SYNC_DAYS', '1')
+WORK_CALENDAR_ID = os.getenv('WORK_CALENDAR_ID')
+FAMILY_CALENDAR_ID = os.getenv('FAMILY_CALENDAR_ID')
+OBSIDIAN_DAILY_NOTES_PATH = os.getenv('OBSIDIAN_DAILY_NOTES_PATH')
+
+# Settings the script can't run without, Google settings are optional
+REQUIRED_SETTINGS = {
+  'TODOIST_API_KEY': TODOIST_API_KEY,
+  'OBSIDIAN_DAILY_NOTES_PATH': OBSIDIAN_DAILY_NOTES_PATH
+}
+
 # Set locale to Finnish
 locale.setlocale(locale.LC_TIME, 'fi_FI.UTF-8')
 
+# Shared session for Todoist API calls, reuses the same HTTPS connection.
+# Failed reads are retried with backoff, POSTs are not so tasks aren't created twice.
+TODOIST_RETRY = Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504))
+TODOIST_SESSION = requests.Session()
+TODOIST_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=TODOIST_RETRY))
+TODOIST_SESSION.headers.update({"Authorization": f"Bearer {TODOIST_API_KEY}"})
+
 # Add a configuration variable
 INCLUDE_COMPLETION_DATE = False
 
-def log_info(message: str):
-  # Get current time in 24-hour format
-  current_time = datetime.now().strftime('%H:%M')
-  print(colored(f"ℹ️  {message}", 'cyan'))
+# Message in a daily note that stops syncing it with Todoist
+SYNC_DISABLED_MARKER = "Synkronointi lopetettu"
 
-def get_todoist_tasks() -> List[Dict]:
-  api_key = os.getenv('TODOIST_API_KEY')
-  headers = {"Authorization": f"Bearer {api_key}"}
+# Sort values for tasks without a due time
+DUE_MIN = datetime.min.replace(tzinfo=timezone.utc)
+DUE_MAX = datetime.max.replace(tzinfo=timezone.utc)
+
+class ColoredFormatter(logging.Formatter):
+  """Format log records with the info icon and cyan color."""
+  def format(self, record: logging.LogRecord) -> str:
+    return colored(f"ℹ️  {super().format(record)}", 'cyan')
+
+# Set up logging, debug messages are only formatted when --verbose is used
+logger = logging.getLogger("daily-note")
+log_handler = logging.StreamHandler(sys.stdout)
+log_handler.setFormatter(ColoredFormatter("%(message)s"))
+logger.addHandler(log_handler)
+logger.setLevel(logging.INFO)
+logger.propagate = False
 
+def log_info(message: str, *args):
+  logger.info(message, *args)
+
+def log_debug(message: str, *args):
+  # Use %-style args in hot loops so nothing gets formatted unless debug is enabled
+  logger.debug(message, *args)
+
+def get_todoist_tasks() -> List[Dict]:
   try:
     log_info("Fetching active tasks from Todoist...")
-    # First get today's tasks
-    response = requests.get(
-      "https://api.todoist.com/rest/v2/tasks",
-      headers=headers,
-      params={"filter": "today"}
-    )
-    response.raise_for_status()
-    today_tasks = response.json()
-
-    # Get all tasks to find subtasks without dates
-    all_response = requests.get(
-      "https://api.todoist.com/rest/v2/tasks",
-      headers=headers
-    )
-    all_response.raise_for_status()
-    all_tasks = all_response.json()
+    # Get all tasks to find today's tasks and their subtasks without dates
+    all_tasks = get_all_tasks()
+    today = datetime.now().strftime('%Y-%m-%d')
+    today_tasks = [task for task in all_tasks if task['due'] and task['due']['date'] == today]
 
     # Create a set of today's task IDs
-    today_task_ids = {str(task['id']) for task in today_tasks}
+    today_task_ids = _task_id_set(today_tasks)
 
     # Add subtasks of today's tasks even if they don't have dates
     tasks = today_tasks.copy()
     for task in all_tasks:
-      parent_id = str(task.get('parent_id')) if task.get('parent_id') else None
-      if parent_id and parent_id in today_task_ids and str(task['id']) not in today_task_ids:
-        log_info(f"Adding dateless subtask: '{task['content']}' with parent ID: {parent_id}")
+      parent_id = task['parent_id']
+      if parent_id and parent_id in today_task_ids and task['id'] not in today_task_ids:
+        log_debug("Adding dateless subtask: '%s' with parent ID: %s", task['content'], parent_id)
         tasks.append(task)
 
     # Time handling for tasks with dates
@@ -70,87 +112,182 @@ def get_todoist_tasks() -> List[Dict]:
         scheduled_time = datetime.fromisoformat(task['due']['datetime'].replace('Z', '+00:00'))
         task['due']['datetime'] = scheduled_time.isoformat()
 
+        # Keep the parsed datetime so formatting doesn't need to parse it again
+        task['_start_dt'] = scheduled_time
+
         # Calculate end time based on duration if available
         if task.get('duration'):
           duration_minutes = task['duration'].get('amount', 0) if isinstance(task['duration'], dict) else int(task['duration'])
           end_time = scheduled_time + timedelta(minutes=duration_minutes)
           task['due']['end_datetime'] = end_time.isoformat()
+          if duration_minutes:
+            task['_end_dt'] = end_time
 
         # Log adjusted time
-        adjusted_time = datetime.fromisoformat(task['due']['datetime'].replace('Z', '+00:00'))
-        log_info(f"  Adjusted time: {adjusted_time.strftime('%H:%M')}")
+        log_debug("  Adjusted time: %s", scheduled_time.strftime('%H:%M'))
 
-    # Create a dictionary to store parent-child relationships
-    child_tasks = {}
-    tasks_by_id = {str(task['id']): task for task in tasks}
-
-    # Group child tasks by parent_id
-    for task in tasks:
-      parent_id = str(task.get('parent_id')) if task.get('parent_id') else None
-      if parent_id:
-        log_info(f"Found today's subtask: '{task['content']}' with parent ID: {parent_id}")
-        if parent_id not in child_tasks:
-          child_tasks[parent_id] = []
-        child_tasks[parent_id].append(task)
-        task['is_subtask'] = True
-        log_info(f"  Added today's subtask to parent {parent_id}")
-
-    # Create ordered list with proper hierarchy
-    ordered_tasks = []
-
-    # Add root tasks and their children in order
-    for task in tasks:
-      task_id = str(task['id'])
-      if not task.get('parent_id'):  # If it's a root task
-        ordered_tasks.append(task)
-        # Add any children
-        if task_id in child_tasks:
-          log_info(f"Adding today's children for task: '{task['content']}'")
-          # Safe sorting that handles tasks without due dates
-          def sort_key(x):
-            if not x.get('due'):
-              return ''
-            return x['due'].get('datetime', '')
-
-          children = sorted(child_tasks[task_id], key=sort_key)
-          for child in children:
-            log_info(f"  Adding today's child: '{child['content']}'")
-          ordered_tasks.extend(children)
+    # Order tasks so that subtasks follow their parents
+    ordered_tasks = _flatten_hierarchy(tasks)
 
     # Get completed tasks
-    completed_tasks = get_completed_tasks(headers)
+    completed_tasks = get_completed_tasks()
 
     log_info(f"Found {len(tasks)} active and {len(completed_tasks)} completed tasks")
-    # Get completed tasks and add them to our list
-    tasks.extend(get_completed_tasks(headers))
     return ordered_tasks + completed_tasks
 
-  except requests.exceptions.RequestException as e:
+  except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
     print(colored(f"Error fetching tasks from Todoist: {e}", 'red'))
     return []
 
-def get_project_names() -> Dict[str, str]:
-  api_key = os.getenv('TODOIST_API_KEY')
-  headers = {
-    "Authorization": f"Bearer {api_key}"
-  }
+@functools.lru_cache(maxsize=1)
+def _todoist_sync() -> Dict[str, List[Dict]]:
+  """Sync projects and tasks from Todoist in one request, only changes since the previous run are transferred."""
+  cache_file = os.path.join(os.path.dirname(__file__), 'todoist_sync.json')
 
+  # Load projects, tasks and sync token saved by the previous run
+  cache = {'sync_token': '*', 'projects': {}, 'items': {}}
   try:
-    response = requests.get(
-      "https://api.todoist.com/rest/v2/projects",
-      headers=headers
-    )
-    response.raise_for_status()
-    projects = response.json()
-    return {str(project['id']): project['name'] for project in projects}
-  except requests.exceptions.RequestException as e:
+    with open(cache_file, 'rb') as f:
+      cache = orjson.loads(f.read())
+  except (OSError, orjson.JSONDecodeError):
+    pass  # No usable cache, do a full sync
+
+  response = TODOIST_SESSION.post(
+    "https://api.todoist.com/sync/v9/sync",
+    data={
+      "sync_token": cache['sync_token'],
+      "resource_types": '["projects", "items"]'
+    }
+  )
+  response.raise_for_status()
+  sync_data = orjson.loads(response.content)
+
+  # Apply changed projects and tasks on top of the cached ones
+  full_sync = sync_data.get('full_sync')
+  projects = {} if full_sync else cache['projects']
+  removed_project_ids = set()
+  for project in sync_data.get('projects', []):
+    if project.get('is_deleted') or project.get('is_archived'):
+      projects.pop(project['id'], None)
+      removed_project_ids.add(project['id'])
+    else:
+      projects[project['id']] = {'id': project['id'], 'name': project['name']}
+
+  items = {} if full_sync else cache['items']
+  for item in sync_data.get('items', []):
+    if item.get('is_deleted') or item.get('checked'):
+      items.pop(item['id'], None)
+    else:
+      items[item['id']] = {
+        'id': item['id'],
+        'parent_id': item.get('parent_id'),
+        'project_id': item.get('project_id'),
+        'content': item.get('content', ''),
+        'priority': item.get('priority', 1),
+        'due': item.get('due'),
+        'duration': item.get('duration')
+      }
+
+  # Tasks of deleted and archived projects are not active anymore
+  if removed_project_ids:
+    items = {item_id: item for item_id, item in items.items() if item['project_id'] not in removed_project_ids}
+
+  try:
+    tmp_file = cache_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+      f.write(orjson.dumps({'sync_token': sync_data['sync_token'], 'projects': projects, 'items': items}))
+    os.replace(tmp_file, cache_file)
+  except OSError as e:
+    print(colored(f"Error saving Todoist sync cache: {e}", 'red'))
+
+  return {'projects': list(projects.values()), 'items': list(items.values())}
+
+def _sync_due_to_rest(due: Optional[Dict]) -> Optional[Dict]:
+  """Convert a Sync API due object to the REST API shape with separate date and datetime."""
+  if not due:
+    return None
+  due = dict(due)
+  if 'T' in due['date']:
+    due_dt = datetime.fromisoformat(due['date'].replace('Z', '+00:00'))
+    if due_dt.tzinfo is None:
+      # Floating time is in the user's timezone
+      due_dt = due_dt.astimezone()
+    # REST API gives the time in UTC and the date in the user's timezone
+    due['datetime'] = due_dt.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    due['date'] = due_dt.astimezone().strftime('%Y-%m-%d')
+  return due
+
+@functools.lru_cache(maxsize=1)
+def _fetch_all_tasks() -> List[Dict]:
+  """Get all active tasks from the Todoist sync, cached until tasks are changed."""
+  tasks = [dict(item, due=_sync_due_to_rest(item['due'])) for item in _todoist_sync()['items']]
+  return normalize_task_ids(tasks)
+
+def _invalidate_tasks_cache():
+  """Forget cached tasks after changing them, the next read syncs the changes from Todoist."""
+  _todoist_sync.cache_clear()
+  _fetch_all_tasks.cache_clear()
+
+def get_all_tasks() -> List[Dict]:
+  """Get all active tasks, reusing the previous response when nothing has changed."""
+  # Copy the task dicts so callers can modify them without touching the cache
+  return [dict(task, due=dict(task['due']) if task['due'] else None) for task in _fetch_all_tasks()]
+
+def normalize_task_ids(tasks: List[Dict]) -> List[Dict]:
+  """Convert task and parent IDs to strings once, so they can be compared directly."""
+  for task in tasks:
+    task['id'] = str(task['id'])
+    parent_id = task.get('parent_id')
+    task['parent_id'] = str(parent_id) if parent_id else None
+  return tasks
+
+def _task_id_set(tasks) -> frozenset:
+  """Collect task IDs as strings for fast membership checks."""
+  return frozenset(str(task['id']) for task in tasks)
+
+def _fetch_all_projects() -> List[Dict]:
+  """Get all Todoist projects from the sync."""
+  return _todoist_sync()['projects']
+
+@functools.lru_cache(maxsize=1)
+def _project_ids_by_name() -> Dict[str, str]:
+  """Map project names to IDs, first project wins if names are duplicated."""
+  project_ids = {}
+  for project in _fetch_all_projects():
+    project_ids.setdefault(project['name'], project['id'])
+  return project_ids
+
+@functools.lru_cache(maxsize=1)
+def _project_names_by_id() -> Dict[str, str]:
+  """Map project IDs to names, built once per run."""
+  return {str(project['id']): project['name'] for project in _fetch_all_projects()}
+
+def get_project_names() -> Dict[str, str]:
+  try:
+    return _project_names_by_id()
+  except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
     print(colored(f"Error fetching projects: {e}", 'red'))
     return {}
 
+# Characters not allowed in class strings, as a translate table for the ASCII range
+CLASS_CHARS_PATTERN = re.compile(r'[^a-zA-Z0-9\s]')
+CLASS_CHARS_TABLE = {c: None for c in range(128) if CLASS_CHARS_PATTERN.match(chr(c))}
+
+# Markdown links [[like this]]
+MARKDOWN_LINK_PATTERN = re.compile(r'\[\[.*?\]\]')
+
+def strip_class_chars(text: str) -> str:
+  """Keep only letters, numbers and whitespace."""
+  cleaned = text.translate(CLASS_CHARS_TABLE)
+  # The table only covers ASCII, fall back to regex for anything else
+  if not cleaned.isascii():
+    cleaned = CLASS_CHARS_PATTERN.sub('', cleaned)
+  return cleaned
+
 def content_to_classes(content: str) -> str:
   # Remove special characters and convert to lowercase
   # Keep only letters, numbers, and spaces
-  cleaned = re.sub(r'[^a-zA-Z0-9\s]', '', content)
+  cleaned = strip_class_chars(content)
 
   # Split into words and filter out empty strings
   words = [word.lower() for word in cleaned.split() if word]
@@ -161,21 +298,100 @@ def content_to_classes(content: str) -> str:
 def create_class_string(content: str) -> str:
   """Create a class string from task content by converting to lowercase and removing special characters."""
   # Remove markdown links [[like this]]
-  content = re.sub(r'\[\[.*?\]\]', '', content)
+  content = MARKDOWN_LINK_PATTERN.sub('', content)
 
   # Remove any remaining special characters and convert to lowercase
-  class_str = re.sub(r'[^a-zA-Z0-9\s]', '', content.lower())
+  class_str = strip_class_chars(content.lower())
 
   # Replace spaces with spaces (for readability in HTML)
   class_str = class_str.replace(' ', ' ')
 
   return class_str.strip()
 
+def _group_children(tasks: List[Dict]):
+  """Split tasks into root tasks and a dict of child tasks by parent ID, in one pass."""
+  root_tasks = []
+  child_tasks = {}
+  for task in tasks:
+    parent_id = task['parent_id']
+    if parent_id:
+      log_debug("Found subtask: '%s' with parent ID: %s", task.get('content'), parent_id)
+      child_tasks.setdefault(parent_id, []).append(task)
+      task['is_subtask'] = True
+    else:
+      root_tasks.append(task)
+  return root_tasks, child_tasks
+
+def _flatten_hierarchy(tasks: List[Dict]) -> List[Dict]:
+  """Order tasks so that each root task is followed by its subtasks."""
+  # Nothing to reorder when there are no subtasks
+  if not any(task['parent_id'] for task in tasks):
+    return list(tasks)
+
+  root_tasks, child_tasks = _group_children(tasks)
+
+  # Safe sorting that handles tasks without due dates
+  def sort_key(task):
+    return _due_dt(task) or DUE_MIN
+
+  # Add root tasks and their children in order
+  ordered_tasks = []
+  for task in root_tasks:
+    ordered_tasks.append(task)
+    children = child_tasks.get(task['id'])
+    if children:
+      log_debug("Adding children for task: '%s'", task['content'])
+      ordered_tasks.extend(sorted(children, key=sort_key))
+
+  return ordered_tasks
+
+def _due_dt(task: Dict):
+  """Return the parsed due datetime of a task, parsing it only once."""
+  if '_start_dt' in task:
+    return task['_start_dt']
+  due_datetime = task['due'].get('datetime') if task.get('due') else None
+  task['_start_dt'] = datetime.fromisoformat(due_datetime.replace('Z', '+00:00')) if due_datetime else None
+  return task['_start_dt']
+
+def _render_task_line(task: Dict, project_names: Dict[str, str], today: date, indent: str = "") -> str:
+  """Render a single task as a markdown checkbox line."""
+  # Use the completion status from the task data
+  checkbox = "x" if task.get("completed", False) else " "
+  priority = task.get("priority", 1)
+  priority_tag = f'<i d="p{5-priority}">p{5-priority}</i> ' if priority > 1 else ""
+
+  # Get time information
+  time_str = ""
+  if task.get("due") and task["due"].get("datetime"):
+    start_time = _due_dt(task)
+    if start_time.astimezone().date() == today:  # Only show times for today's tasks
+      end_time = task.get("_end_dt")
+      if end_time is None:
+        duration = 0
+        if isinstance(task.get("duration"), dict):
+          duration = task["duration"].get("amount", 0)
+        elif isinstance(task.get("duration"), (int, str)):
+          duration = int(task["duration"])
+        if duration:
+          end_time = start_time + timedelta(minutes=duration)
+
+      if end_time is not None:
+        start_local = start_time.astimezone().strftime("%H:%M")
+        end_local = end_time.astimezone().strftime("%H:%M")
+        time_str = f"{start_local} - {end_local} "
+
+  # Format task line
+  project_id = str(task.get("project_id")) if task.get("project_id") else None
+  project_name = project_names.get(project_id, "")
+  content = task.get("content", "").replace(" @Google-kalenterin tapahtuma", "")
+  class_str = create_class_string(content)
+  return f"{indent}- [{checkbox}] {time_str}{priority_tag}<span data-id=\"{task['id']}\" data-project=\"{project_name}\" class=\"{class_str}\"></span>{content}"
+
 def format_todoist_tasks(tasks: List[Dict], is_today: bool = False) -> str:
   # Get project names
   project_names = get_project_names()
   formatted_tasks = []
-  today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+  today = date.today()
 
   # Count all tasks for today, including completed ones
   total_tasks = len(tasks)
@@ -187,187 +403,110 @@ def format_todoist_tasks(tasks: List[Dict], is_today: bool = False) -> str:
   else:
     formatted_tasks.append(f"{total_tasks} {task_text}.\n")
 
-  # Create a dictionary to store parent-child relationships
-  child_tasks = {}
-  tasks_by_id = {str(task['id']): task for task in tasks}
-
   # Remove duplicate tasks (keep the newest one based on task ID)
   unique_tasks = {}
   for task in tasks:
     content = task.get("content", "").replace(" @Google-kalenterin tapahtuma", "")
-    parent_id = str(task.get('parent_id')) if task.get('parent_id') else None
+    parent_id = task['parent_id']
 
     # Create a unique key that includes parent_id to differentiate subtasks
-    unique_key = f"{content}_{parent_id}"
+    unique_key = (content, parent_id)
+    task_id = int(task['id'])
 
     # If we haven't seen this task before, or if this is a newer version
-    if unique_key not in unique_tasks or int(task['id']) > int(unique_tasks[unique_key]['id']):
-      unique_tasks[unique_key] = task
-      log_info(f"Added/Updated task in unique_tasks: {content} (ID: {task['id']}, Parent: {parent_id})")
+    seen = unique_tasks.get(unique_key)
+    if seen is None or task_id > seen[0]:
+      unique_tasks[unique_key] = (task_id, task)
+      log_debug("Added/Updated task in unique_tasks: %s (ID: %s, Parent: %s)", content, task['id'], parent_id)
 
   # Use the deduplicated tasks list
-  tasks = list(unique_tasks.values())
+  tasks = [task for _, task in unique_tasks.values()]
   log_info(f"After deduplication: {len(tasks)} tasks")
 
   # Group child tasks by parent_id
-  for task in tasks:
-    parent_id = str(task.get('parent_id')) if task.get('parent_id') else None
-    if parent_id:
-      if parent_id not in child_tasks:
-        child_tasks[parent_id] = []
-      child_tasks[parent_id].append(task)
-      task['is_subtask'] = True
-      log_info(f"Added child task: {task.get('content')} to parent {parent_id}")
-
-  # Create ordered list with proper hierarchy
-  ordered_tasks = []
+  root_tasks, child_tasks = _group_children(tasks)
 
   # Add root tasks and their children in order
-  root_tasks = [task for task in tasks if not task.get('parent_id')]
   log_info(f"Found {len(root_tasks)} root tasks")
 
+  # Sort order: completed tasks at the bottom, then priority (higher first),
+  # then due time (unscheduled last), then creation date (task ID as proxy, newer first)
   def sort_key(task):
-    # 1. Priority (negative so higher priority comes first)
-    priority = -(task.get('priority', 1))
-
-    # 2. Time (if scheduled)
-    time_str = '999999'  # Default high value for unscheduled tasks
-    if task.get('due') and task['due'].get('datetime'):
-      dt = datetime.fromisoformat(task['due']['datetime'].replace('Z', '+00:00'))
-      time_str = dt.strftime('%H%M%S')
-
-    # 3. Creation date (task ID as proxy, negative so newer comes first)
-    creation_order = -int(task['id'])
-
-    # 4. Completed tasks at the bottom
-    is_completed = 1 if task.get("completed", False) else 0
-
-    return (is_completed, priority, time_str, creation_order)
+    return (
+      1 if task.get("completed", False) else 0,
+      -task.get('priority', 1),
+      _due_dt(task) or DUE_MAX,
+      -int(task['id'])
+    )
 
   # Sort root tasks
   root_tasks.sort(key=sort_key)
 
   # Add root tasks and their children in order
   for task in root_tasks:
-    task_id = str(task['id'])
-    log_info(f"Processing root task: {task.get('content')} (ID: {task_id})")
-
-    # Use the completion status from the task data
-    checkbox = "x" if task.get("completed", False) else " "
-    priority = task.get("priority", 1)
-    priority_tag = f'<i d="p{5-priority}">p{5-priority}</i> ' if priority > 1 else ""
-
-    # Get time information
-    time_str = ""
-    if task.get("due") and task["due"].get("datetime"):
-      start_time = datetime.fromisoformat(task["due"]["datetime"].replace('Z', '+00:00'))
-      task_date = start_time.strftime("%Y-%m-%d")
-      if task_date == today:  # Only show times for today's tasks
-        duration = 0
-        if isinstance(task.get("duration"), dict):
-          duration = task["duration"].get("amount", 0)
-        elif isinstance(task.get("duration"), (int, str)):
-          duration = int(task["duration"])
+    task_id = task['id']
+    log_debug("Processing root task: %s (ID: %s)", task.get('content'), task_id)
 
-        if duration:
-          end_time = start_time + timedelta(minutes=duration)
-          start_local = start_time.astimezone().strftime("%H:%M")
-          end_local = end_time.astimezone().strftime("%H:%M")
-          time_str = f"{start_local} - {end_local} "
-
-    # Format task line
-    project_id = str(task.get("project_id")) if task.get("project_id") else None
-    project_name = project_names.get(project_id, "")
-    content = task.get("content", "").replace(" @Google-kalenterin tapahtuma", "")
-    class_str = create_class_string(content)
-    task_line = f"- [{checkbox}] {time_str}{priority_tag}<span data-id=\"{task['id']}\" data-project=\"{project_name}\" class=\"{class_str}\"></span>{content}"
-    formatted_tasks.append(task_line)
+    formatted_tasks.append(_render_task_line(task, project_names, today))
 
     # Add any children
     if task_id in child_tasks:
-      children = sorted(child_tasks[task_id], key=sort_key)
-      for child in children:
-        # Use the completion status from the child task data
-        checkbox = "x" if child.get("completed", False) else " "
-        priority = child.get("priority", 1)
-        priority_tag = f'<i d="p{5-priority}">p{5-priority}</i> ' if priority > 1 else ""
-
-        # Get time information for child task
-        time_str = ""
-        if child.get("due") and child["due"].get("datetime"):
-          start_time = datetime.fromisoformat(child["due"]["datetime"].replace('Z', '+00:00'))
-          task_date = start_time.strftime("%Y-%m-%d")
-          if task_date == today:  # Only show times for today's tasks
-            duration = 0
-            if isinstance(child.get("duration"), dict):
-              duration = child["duration"].get("amount", 0)
-            elif isinstance(child.get("duration"), (int, str)):
-              duration = int(child["duration"])
-
-            if duration:
-              end_time = start_time + timedelta(minutes=duration)
-              start_local = start_time.astimezone().strftime("%H:%M")
-              end_local = end_time.astimezone().strftime("%H:%M")
-              time_str = f"{start_local} - {end_local} "
-
-        content = child.get("content", "").replace(" @Google-kalenterin tapahtuma", "")
-        class_str = create_class_string(content)
-        child_line = f"\t- [{checkbox}] {time_str}{priority_tag}<span data-id=\"{child['id']}\" data-project=\"{project_name}\" class=\"{class_str}\"></span>{content}"
-        formatted_tasks.append(child_line)
+      for child in sorted(child_tasks[task_id], key=sort_key):
+        formatted_tasks.append(_render_task_line(child, project_names, today, indent="\t"))
 
   return "\n".join(formatted_tasks)
 
+# Task line in a daily note, captures completion status, task ID and content
+TASK_LINE_PATTERN = re.compile(r'- \[([ x])\] .*?<span data-id="(\d+)".*?>(.*?)</span>')
+
 def read_existing_note(file_path: str) -> List[Dict]:
   if not os.path.exists(file_path):
     return []
 
-  with open(file_path, 'r', encoding='utf-8') as f:
-    content = f.readlines()
-
   tasks = []
-  # Updated regex to capture completion status and full line
-  task_pattern = re.compile(r'- \[([ x])\] .*?<span data-id="(\d+)".*?>(.*?)</span>')
-  for line in content:
-    match = task_pattern.search(line)
-    if match:
-      completed = match.group(1) == 'x'
-      task_id = match.group(2)
-      task_content = match.group(3)
-      tasks.append({
-        "id": task_id,
-        "content": task_content,
-        "completed": completed,
-        "line": line.strip()
-      })
+  with open(file_path, 'r', encoding='utf-8') as f:
+    for line in f:
+      # Cheap check first, most lines are headings and text without tasks
+      if '<span data-id="' not in line:
+        continue
+      match = TASK_LINE_PATTERN.search(line)
+      if match:
+        completed = match.group(1) == 'x'
+        task_id = match.group(2)
+        task_content = match.group(3)
+        tasks.append({
+          "id": task_id,
+          "content": task_content,
+          "completed": completed,
+          "line": line.strip()
+        })
 
   return tasks
 
-def sync_tasks_with_todoist(note_tasks: List[Dict], todoist_tasks: List[Dict], note_path: str):
+def sync_tasks_with_todoist(note_tasks: List[Dict], todoist_tasks: List[Dict], note_path: str) -> bool:
+  """Sync completion status between the note and Todoist, returns True if Todoist tasks were changed."""
   # First check if sync is disabled in the note
   try:
     with open(note_path, 'r', encoding='utf-8') as f:
-      content = f.readlines()
-      # Look for sync stop message outside of blockquotes
-      for line in content:
+      # Look for sync stop message outside of blockquotes, stop at the first hit
+      for line in f:
         if line.startswith('>'):  # Skip blockquote lines
           continue
-        if "Synkronointi lopetettu" in line:
+        if SYNC_DISABLED_MARKER in line:
           log_info("Sync disabled in note - skipping Todoist sync")
-          return
+          return False
   except FileNotFoundError:
     pass  # Note doesn't exist yet, continue with sync
 
-  # Get completed tasks with timestamps
-  api_key = os.getenv('TODOIST_API_KEY')
-  headers = {"Authorization": f"Bearer {api_key}"}
+  changed = False
 
+  # Get completed tasks with timestamps
   try:
-    response = requests.get(
-      "https://api.todoist.com/sync/v9/completed/get_all",
-      headers=headers
+    response = TODOIST_SESSION.get(
+      "https://api.todoist.com/sync/v9/completed/get_all"
     )
     response.raise_for_status()
-    completed_data = response.json()
+    completed_data = orjson.loads(response.content)
 
     # Create a map of task_id to completion time
     todoist_completion_times = {
@@ -375,57 +514,66 @@ def sync_tasks_with_todoist(note_tasks: List[Dict], todoist_tasks: List[Dict], n
       for item in completed_data.get("items", [])
     }
 
+    # Index Todoist tasks by ID, first one wins if a task is listed twice
+    todoist_tasks_by_id = {}
+    for todoist_task in todoist_tasks:
+      todoist_task_id = todoist_task.get("id")
+      if todoist_task_id:
+        todoist_tasks_by_id.setdefault(str(todoist_task_id), todoist_task)
+
     for note_task in note_tasks:
       note_task_id = note_task.get("id")
       if not note_task_id:
         continue
 
-      for todoist_task in todoist_tasks:
-        todoist_task_id = todoist_task.get("id")
-        if not todoist_task_id:
-          continue
-
-        if note_task_id == str(todoist_task_id):
-          # Handle completion sync only
-          note_completed = note_task.get("completed", False)
-          todoist_completed = todoist_task.get("completed", False)
-
-          if note_completed != todoist_completed:
-            # If task has a completion time in Todoist, use Todoist's state
-            if note_task_id in todoist_completion_times:
-              if todoist_completed:
-                log_info(f"Task {note_task_id} was completed in Todoist at {todoist_completion_times[note_task_id]}")
-                note_task["completed"] = True
-              else:
-                log_info(f"Task {note_task_id} was uncompleted in Todoist")
-                note_task["completed"] = False
-            # If no completion time in Todoist, use Obsidian's state
-            else:
-              if note_completed:
-                log_info(f"Completing task {note_task_id} in Todoist to match note")
-                close_todoist_task(todoist_task_id)
-              else:
-                log_info(f"Reopening task {note_task_id} in Todoist to match note")
-                reopen_todoist_task(todoist_task_id)
+      todoist_task = todoist_tasks_by_id.get(note_task_id)
+      if todoist_task is None:
+        continue
+      todoist_task_id = todoist_task["id"]
+
+      # Handle completion sync only
+      note_completed = note_task.get("completed", False)
+      todoist_completed = todoist_task.get("completed", False)
+
+      if note_completed != todoist_completed:
+        # If task has a completion time in Todoist, use Todoist's state
+        if note_task_id in todoist_completion_times:
+          if todoist_completed:
+            log_info(f"Task {note_task_id} was completed in Todoist at {todoist_completion_times[note_task_id]}")
+            note_task["completed"] = True
+          else:
+            log_info(f"Task {note_task_id} was uncompleted in Todoist")
+            note_task["completed"] = False
+        # If no completion time in Todoist, use Obsidian's state
+        else:
+          if note_completed:
+            log_info(f"Completing task {note_task_id} in Todoist to match note")
+            close_todoist_task(todoist_task_id)
+            changed = True
+          else:
+            log_info(f"Reopening task {note_task_id} in Todoist to match note")
+            reopen_todoist_task(todoist_task_id)
+            changed = True
 
-  except requests.exceptions.RequestException as e:
+  except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
     print(colored(f"Error fetching data: {e}", 'red'))
 
+  return changed
+
 def close_todoist_task(task_id: str):
   """Mark a Todoist task as completed."""
-  api_key = os.getenv('TODOIST_API_KEY')
   headers = {
-    "Authorization": f"Bearer {api_key}",
     "X-Request-Id": str(uuid.uuid4())
   }
 
   try:
-    response = requests.post(
+    response = TODOIST_SESSION.post(
       f"https://api.todoist.com/rest/v2/tasks/{task_id}/close",
       headers=headers
     )
     if response.status_code == 204:
       log_info(f"Task {task_id} marked as completed")
+      _invalidate_tasks_cache()
     else:
       print(colored(f"Failed to complete task {task_id}: {response.status_code}", 'red'))
       if response.text:
@@ -436,19 +584,18 @@ def close_todoist_task(task_id: str):
 
 def reopen_todoist_task(task_id: str):
   """Reopen a completed Todoist task."""
-  api_key = os.getenv('TODOIST_API_KEY')
   headers = {
-    "Authorization": f"Bearer {api_key}",
     "X-Request-Id": str(uuid.uuid4())
   }
 
   try:
-    response = requests.post(
+    response = TODOIST_SESSION.post(
       f"https://api.todoist.com/rest/v2/tasks/{task_id}/reopen",
       headers=headers
     )
     if response.status_code == 204:
       log_info(f"Task {task_id} reopened")
+      _invalidate_tasks_cache()
     else:
       print(colored(f"Failed to reopen task {task_id}: {response.status_code}", 'red'))
       if response.text:
@@ -459,9 +606,7 @@ def reopen_todoist_task(task_id: str):
 
 def update_todoist_task(task_id: str, updates: Dict):
   """Update a Todoist task with the given updates."""
-  api_key = os.getenv('TODOIST_API_KEY')
   headers = {
-    "Authorization": f"Bearer {api_key}",
     "Content-Type": "application/json",
     "X-Request-Id": str(uuid.uuid4())
   }
@@ -477,13 +622,14 @@ def update_todoist_task(task_id: str, updates: Dict):
   log_info(f"  Updates: {updates}")
 
   try:
-    response = requests.post(
+    response = TODOIST_SESSION.post(
       f"https://api.todoist.com/rest/v2/tasks/{task_id}",
       headers=headers,
       json=updates
     )
     if response.status_code in [200, 204]:
       log_info(f"Task {task_id} updated successfully")
+      _invalidate_tasks_cache()
     else:
       print(colored(f"Failed to update task {task_id}: {response.status_code}", 'red'))
       if response.text:
@@ -493,177 +639,163 @@ def update_todoist_task(task_id: str, updates: Dict):
     print(colored(f"Error updating task: {e}", 'red'))
 
 def get_backlog_tasks() -> List[Dict]:
-  api_key = os.getenv('TODOIST_API_KEY')
-  headers = {
-    "Authorization": f"Bearer {api_key}"
-  }
-
   try:
     log_info("Fetching backlog tasks...")
-    response = requests.get(
-      "https://api.todoist.com/rest/v2/tasks",
-      headers=headers,
-      params={"filter": "overdue | no date"}
-    )
-    response.raise_for_status()
-    backlog_tasks = response.json()
+    all_tasks = get_all_tasks()
+    today = datetime.now().strftime('%Y-%m-%d')
+
+    # Overdue tasks and tasks without a date
+    backlog_tasks = [task for task in all_tasks if not task['due'] or task['due']['date'] < today]
 
     # Get IDs of today's tasks to exclude their subtasks from backlog
-    today_response = requests.get(
-      "https://api.todoist.com/rest/v2/tasks",
-      headers=headers,
-      params={"filter": "today"}
+    today_task_ids = _task_id_set(
+      task for task in all_tasks
+      if task['due'] and task['due']['date'] == today
     )
-    today_response.raise_for_status()
-    today_tasks = today_response.json()
-    today_task_ids = {task['id'] for task in today_tasks}
 
     # Filter out subtasks of today's tasks from backlog
     backlog_tasks = [
       task for task in backlog_tasks
-      if not task.get('parent_id') in today_task_ids
+      if task['parent_id'] not in today_task_ids
     ]
 
     # Sort by priority (higher number = higher priority)
-    backlog_tasks.sort(key=lambda x: x.get('priority', 1), reverse=True)
+    for task in backlog_tasks:
+      task.setdefault('priority', 1)
+    backlog_tasks.sort(key=operator.itemgetter('priority'), reverse=True)
     return backlog_tasks
-  except requests.exceptions.RequestException as e:
+  except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
     print(colored(f"Error fetching backlog tasks: {e}", 'red'))
     return []
 
 def get_future_tasks() -> List[Dict]:
-  api_key = os.getenv('TODOIST_API_KEY')
-  headers = {
-    "Authorization": f"Bearer {api_key}"
-  }
-
   try:
     log_info("Fetching future tasks...")
-    # First get future tasks
-    response = requests.get(
-      "https://api.todoist.com/rest/v2/tasks",
-      headers=headers,
-      params={"filter": "due after: today"}
-    )
-    response.raise_for_status()
-    future_tasks = response.json()
-
-    # Get all tasks to find subtasks without dates
-    all_response = requests.get(
-      "https://api.todoist.com/rest/v2/tasks",
-      headers=headers
-    )
-    all_response.raise_for_status()
-    all_tasks = all_response.json()
+    # Get all tasks to find future tasks and their subtasks without dates
+    all_tasks = get_all_tasks()
+    today = datetime.now().strftime('%Y-%m-%d')
+    future_tasks = [task for task in all_tasks if task['due'] and task['due']['date'] > today]
 
     # Create a set of future task IDs
-    future_task_ids = {str(task['id']) for task in future_tasks}
+    future_task_ids = _task_id_set(future_tasks)
 
     # Add subtasks of future tasks even if they don't have dates
     tasks = future_tasks.copy()
     for task in all_tasks:
-      parent_id = str(task.get('parent_id')) if task.get('parent_id') else None
-      if parent_id and parent_id in future_task_ids and str(task['id']) not in future_task_ids:
-        log_info(f"Adding dateless future subtask: '{task['content']}' with parent ID: {parent_id}")
+      parent_id = task['parent_id']
+      if parent_id and parent_id in future_task_ids and task['id'] not in future_task_ids:
+        log_debug("Adding dateless future subtask: '%s' with parent ID: %s", task['content'], parent_id)
         tasks.append(task)
 
-    # Create a dictionary to store parent-child relationships
-    child_tasks = {}
-    tasks_by_id = {str(task['id']): task for task in tasks}
-
-    # Group child tasks by parent_id
-    for task in tasks:
-      parent_id = str(task.get('parent_id')) if task.get('parent_id') else None
-      if parent_id:
-        log_info(f"Found future subtask: '{task['content']}' with parent ID: {parent_id}")
-        if parent_id not in child_tasks:
-          child_tasks[parent_id] = []
-        child_tasks[parent_id].append(task)
-        task['is_subtask'] = True
-        log_info(f"  Added future subtask to parent {parent_id}")
-
-    # Create ordered list with proper hierarchy
-    ordered_tasks = []
-
-    # Add root tasks and their children in order
-    for task in tasks:
-      task_id = str(task['id'])
-      if not task.get('parent_id'):  # If it's a root task
-        ordered_tasks.append(task)
-        # Add any children
-        if task_id in child_tasks:
-          log_info(f"Adding future children for task: '{task['content']}'")
-          # Safe sorting that handles tasks without due dates
-          def sort_key(x):
-            if not x.get('due'):
-              return ''
-            return x['due'].get('datetime', '')
-
-          children = sorted(child_tasks[task_id], key=sort_key)
-          for child in children:
-            log_info(f"  Adding future child: '{child['content']}'")
-          ordered_tasks.extend(children)
+    # Order tasks so that subtasks follow their parents
+    ordered_tasks = _flatten_hierarchy(tasks)
 
     # Sort by priority (higher number = higher priority)
     ordered_tasks.sort(key=lambda x: x.get('priority', 1), reverse=True)
     return ordered_tasks
-  except requests.exceptions.RequestException as e:
+  except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
     print(colored(f"Error fetching future tasks: {e}", 'red'))
     return []
 
-def refresh_google_token() -> str:
-  """Refresh Google API token using refresh token."""
-  response = requests.post(
-    'https://accounts.google.com/o/oauth2/token',
-    data={
-      'client_id': os.getenv('GOOGLE_CLIENT_ID'),
-      'client_secret': os.getenv('GOOGLE_CLIENT_SECRET'),
-      'refresh_token': os.getenv('GOOGLE_REFRESH_TOKEN'),
-      'grant_type': 'refresh_token'
-    }
+@functools.lru_cache(maxsize=1)
+def _get_calendar_service():
+  """Build the Google Calendar service once per run."""
+  creds = Credentials(
+    token=None,
+    refresh_token=GOOGLE_REFRESH_TOKEN,
+    client_id=GOOGLE_CLIENT_ID,
+    client_secret=GOOGLE_CLIENT_SECRET,
+    token_uri='https://oauth2.googleapis.com/token'
   )
-  return response.json()['access_token']
-
-def load_synced_events() -> Dict[str, List[Dict]]:
-  """Load previously synced events from log file."""
-  log_file = os.path.join(os.path.dirname(__file__), 'synced_events.log')
+  # Get an access token now so auth problems show up before any calendar calls,
+  # the client library refreshes it again by itself if it expires during the run
+  creds.refresh(Request())
+
+  # Use the discovery document bundled with the client library instead of downloading it
+  return build('calendar', 'v3', credentials=creds, static_discovery=True)
+
+@functools.lru_cache(maxsize=1)
+def _synced_events_db() -> sqlite3.Connection:
+  """Open the synced events database, importing the old synced_events.log on first use."""
+  script_dir = os.path.dirname(__file__)
+  conn = sqlite3.connect(os.path.join(script_dir, 'synced_events.db'))
+  conn.execute('CREATE TABLE IF NOT EXISTS events (id TEXT PRIMARY KEY, title TEXT, date TEXT)')
+  conn.execute('CREATE INDEX IF NOT EXISTS events_date ON events (date)')
+
+  # Move events from the log file used by earlier versions
+  log_file = os.path.join(script_dir, 'synced_events.log')
+  if os.path.exists(log_file) and conn.execute('SELECT 1 FROM events LIMIT 1').fetchone() is None:
+    rows = []
+    with open(log_file, 'r', encoding='utf-8') as f:
+      for line in f:
+        # Parse event_id|title|date in one pass, titles may contain pipes too
+        event_id, _, rest = line.partition('|')
+        title, separator, event_date = rest.rpartition('|')
+        if separator:
+          rows.append((event_id, title, event_date.strip()))
+    conn.executemany('INSERT OR REPLACE INTO events VALUES (?, ?, ?)', rows)
+    conn.commit()
+    log_info(f"Imported {len(rows)} synced events from synced_events.log")
+
+  return conn
+
+def load_synced_event_keys(since: str) -> set:
+  """Load (event_id, date) pairs of events synced on or after the given date."""
   try:
-    if os.path.exists(log_file):
-      with open(log_file, 'r', encoding='utf-8') as f:
-        return {line.split('|')[0]: {
-          'title': line.split('|')[1],
-          'date': line.split('|')[2].strip()
-        } for line in f if '|' in line}
-    return {}
-  except Exception as e:
+    return set(_synced_events_db().execute('SELECT id, date FROM events WHERE date >= ?', (since,)))
+  except sqlite3.Error as e:
     print(colored(f"Error loading synced events: {e}", 'red'))
-    return {}
+    return set()
+
+# Synced events waiting to be written to the database
+_pending_synced_events = []
 
-def save_synced_event(event_id: str, title: str, date: str):
-  """Save synced event to log file."""
-  log_file = os.path.join(os.path.dirname(__file__), 'synced_events.log')
+def save_synced_event(event_id: str, title: str, event_date: str):
+  """Save synced event, written to the database by flush_synced_events()."""
+  _pending_synced_events.append((event_id, title, event_date))
+
+def flush_synced_events():
+  """Write all pending synced events to the database in one transaction."""
+  if not _pending_synced_events:
+    return
   try:
-    with open(log_file, 'a', encoding='utf-8') as f:
-      f.write(f"{event_id}|{title}|{date}\n")
-  except Exception as e:
-    print(colored(f"Error saving synced event: {e}", 'red'))
-
-def task_exists_in_todoist(event_id: str, event_title: str, event_date: str) -> bool:
-  """Check if event was already synced using the log file."""
-  synced_events = load_synced_events()
-  if event_id in synced_events:
-    event = synced_events[event_id]
-    if event['date'] == event_date:
-      log_info(f"Found matching synced event: {event_title} on {event_date}")
-      return True
-  return False
+    conn = _synced_events_db()
+    with conn:
+      conn.executemany('INSERT OR REPLACE INTO events VALUES (?, ?, ?)', _pending_synced_events)
+    _pending_synced_events.clear()
+  except sqlite3.Error as e:
+    print(colored(f"Error saving synced events: {e}", 'red'))
+
+# Don't lose synced events if the run is interrupted
+atexit.register(flush_synced_events)
+
+# Runs of whitespace, collapsed when comparing titles
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+def _clean_task_title(title: str) -> str:
+  """Normalize a task or event title for comparison."""
+  title = WHITESPACE_PATTERN.sub(' ', title.lower().strip())
+  # Remove any common suffixes that might be added
+  return title.replace(' @google-kalenterin tapahtuma', '')
+
+def _add_to_date_buckets(tasks_by_date: Dict[str, List], title: str, task_dt: datetime):
+  """Add a timed task to the comparison buckets under its date."""
+  tasks_by_date.setdefault(task_dt.strftime('%Y-%m-%d'), []).append((_clean_task_title(title), task_dt))
 
-def find_similar_todoist_task(event_title: str, start_dt: datetime, all_tasks: List[Dict]) -> bool:
+def build_tasks_by_date(all_tasks: List[Dict]) -> Dict[str, List]:
+  """Group timed tasks by due date as (clean title, due datetime) pairs."""
+  tasks_by_date = {}
+  for task in all_tasks:
+    # Only tasks with a due time can match a calendar event
+    if task.get('due') and task['due'].get('datetime'):
+      task_dt = datetime.fromisoformat(task['due']['datetime'].replace('Z', '+00:00'))
+      _add_to_date_buckets(tasks_by_date, task.get('content', ''), task_dt)
+  return tasks_by_date
+
+def find_similar_todoist_task(event_title: str, start_dt: datetime, tasks_by_date: Dict[str, List]) -> bool:
   """Check if a similar task already exists in Todoist."""
   # Clean up event title for comparison
-  clean_event = re.sub(r'\s+', ' ', event_title.lower().strip())
-  # Remove any common suffixes that might be added
-  clean_event = clean_event.replace(' @google-kalenterin tapahtuma', '')
+  clean_event = _clean_task_title(event_title)
 
   # Get the date part for comparison
   event_date = start_dt.strftime('%Y-%m-%d')
@@ -671,149 +803,253 @@ def find_similar_todoist_task(event_title: str, start_dt: datetime, all_tasks: L
 
   log_info(f"Checking for similar tasks to: '{clean_event}' on {event_date} at {event_time}")
 
-  for task in all_tasks:
-    # Clean up task title
-    task_title = task.get('content', '').lower().strip()
-    task_title = re.sub(r'\s+', ' ', task_title)
-    task_title = task_title.replace(' @google-kalenterin tapahtuma', '')
+  # Only tasks on the same date can match
+  for task_title, task_dt in tasks_by_date.get(event_date, ()):
+    log_debug("Found task on same date: '%s' at %s", task_title, task_dt.strftime('%H:%M'))
 
-    # Check if task has a due date
-    if task.get('due') and task['due'].get('datetime'):
-      task_dt = datetime.fromisoformat(task['due']['datetime'].replace('Z', '+00:00'))
-      task_date = task_dt.strftime('%Y-%m-%d')
-      task_time = task_dt.strftime('%H:%M')
-
-      # Compare dates and titles
-      if task_date == event_date:
-        log_info(f"Found task on same date: '{task_title}' at {task_time}")
-
-        # Check for exact match (ignoring case and extra spaces)
-        if task_title == clean_event:
-          log_info(f"Found exact match: '{task_title}'")
-          return True
-
-        # Check for similar titles
-        similarity = difflib.SequenceMatcher(None, clean_event, task_title).ratio()
-        log_info(f"Similarity ratio: {similarity:.2f} between '{clean_event}' and '{task_title}'")
-
-        # Lower the similarity threshold and also check time proximity
-        if similarity > 0.7:  # More lenient similarity threshold
-          # Check if times are within 5 minutes of each other
-          time_diff = abs((task_dt - start_dt).total_seconds() / 60)
-          if time_diff <= 5:
-            log_info(f"Found similar task with matching time (diff: {time_diff}min): '{task_title}'")
-            return True
-          else:
-            log_info(f"Times don't match (diff: {time_diff}min) for similar task: '{task_title}'")
+    # Check for exact match (ignoring case and extra spaces)
+    if task_title == clean_event:
+      log_info(f"Found exact match: '{task_title}'")
+      return True
+
+    # Check for similar titles, scores under the cutoff come back as 0
+    similarity = fuzz.ratio(clean_event, task_title, score_cutoff=70) / 100
+    log_debug("Similarity ratio: %.2f between '%s' and '%s'", similarity, clean_event, task_title)
+
+    # Lower the similarity threshold and also check time proximity
+    if similarity > 0.7:  # More lenient similarity threshold
+      # Check if times are within 5 minutes of each other
+      time_diff = abs((task_dt - start_dt).total_seconds() / 60)
+      if time_diff <= 5:
+        log_info(f"Found similar task with matching time (diff: {time_diff}min): '{task_title}'")
+        return True
+      else:
+        log_debug("Times don't match (diff: %smin) for similar task: '%s'", time_diff, task_title)
 
   log_info(f"No similar tasks found for: '{clean_event}'")
   return False
 
-def create_todoist_task(event: Dict, project_id: str, dry_run: bool = False):
-  """Create a task in Todoist from Google Calendar event."""
+def _plan_todoist_task(event: Dict, project_id: str, tasks_by_date: Dict[str, List]) -> Optional[Dict]:
+  """Build the Todoist task for a calendar event, or None if no task needs to be created."""
   start = event['start'].get('dateTime')
   end = event['end'].get('dateTime')
 
   if not start or not end:  # Skip full-day events
-    return
+    return None
 
   # Convert to datetime objects and handle timezone
   start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
   end_dt = datetime.fromisoformat(end.replace('Z', '+00:00'))
 
   # Convert to local timezone for Todoist
-  local_tz = datetime.now().astimezone().tzinfo
-  start_dt = start_dt.astimezone(local_tz)
-  end_dt = end_dt.astimezone(local_tz)
+  start_dt = start_dt.astimezone()
+  end_dt = end_dt.astimezone()
 
   # Ensure dates are not too far in the future
   max_future_date = datetime.now(timezone.utc) + timedelta(days=365)
   if start_dt > max_future_date:
     log_info(f"Skipping event too far in future: {event['summary']} on {start_dt}")
-    return
-
-  # Get all current Todoist tasks for comparison
-  api_key = os.getenv('TODOIST_API_KEY')
-  headers = {"Authorization": f"Bearer {api_key}"}
-  try:
-    response = requests.get(
-      "https://api.todoist.com/rest/v2/tasks",
-      headers=headers
-    )
-    response.raise_for_status()
-    all_tasks = response.json()
+    return None
 
-    # Check for similar existing tasks
-    if find_similar_todoist_task(event['summary'], start_dt, all_tasks):
-      log_info(f"Skipping event that already exists in Todoist: {event['summary']}")
-      # Still save to log to prevent future checks
-      event_date = start_dt.strftime('%Y-%m-%d')
-      save_synced_event(event['id'], event['summary'], event_date)
-      return
+  # Check for similar existing tasks
+  if find_similar_todoist_task(event['summary'], start_dt, tasks_by_date):
+    log_info(f"Skipping event that already exists in Todoist: {event['summary']}")
+    # Still save as synced to prevent future checks
+    save_synced_event(event['id'], event['summary'], start_dt.strftime('%Y-%m-%d'))
+    return None
 
-  except requests.exceptions.RequestException as e:
-    print(colored(f"Error fetching Todoist tasks: {e}", 'red'))
-    return
+  # Count the planned task as existing so a duplicate event in this run matches it
+  _add_to_date_buckets(tasks_by_date, event['summary'], start_dt)
 
   # Calculate duration in minutes
   duration = int((end_dt - start_dt).total_seconds() / 60)
 
+  return {
+    'content': event['summary'],
+    'due_datetime': start_dt.isoformat(),
+    'project_id': project_id,
+    'duration': duration,
+    'duration_unit': 'minute',
+    'labels': ['Google-kalenterin tapahtuma']
+  }
+
+def _post_todoist_task(event: Dict, task: Dict, dry_run: bool = False) -> bool:
+  """Create a planned task in Todoist, returns False if it should be retried later."""
+  event_date = task['due_datetime'][:10]
+
   if dry_run:
-    # Just save to log file without creating task
-    event_date = start_dt.strftime('%Y-%m-%d')
+    # Just save as synced without creating task
     save_synced_event(event['id'], event['summary'], event_date)
     print(colored(f"[DRY RUN] Would create task: {event['summary']}", 'yellow'))
-    return
+    return True
 
   # Create actual task if not dry run
-  response = requests.post(
-    'https://api.todoist.com/rest/v2/tasks',
-    headers={
-      'Authorization': f"Bearer {os.getenv('TODOIST_API_KEY')}",
-      'Content-Type': 'application/json'
-    },
-    json={
-      'content': event['summary'],
-      'due_datetime': start_dt.isoformat(),
-      'project_id': project_id,
-      'duration': duration,
-      'duration_unit': 'minute',
-      'labels': ['Google-kalenterin tapahtuma']
-    }
-  )
+  try:
+    response = TODOIST_SESSION.post(
+      'https://api.todoist.com/rest/v2/tasks',
+      headers={
+        'Content-Type': 'application/json'
+      },
+      json=task
+    )
+  except requests.exceptions.RequestException as e:
+    print(colored(f"Error creating task {event['summary']}: {e}", 'red'))
+    return False
 
   if response.status_code == 200:
-    # Save the event to our log file
-    event_date = start_dt.strftime('%Y-%m-%d')
+    # Save the event as synced
     save_synced_event(event['id'], event['summary'], event_date)
     print(colored(f"Created task: {event['summary']}", 'green'))
-  else:
-    print(colored(f"Failed to create task: {event['summary']}", 'red'))
+    return True
+
+  print(colored(f"Failed to create task: {event['summary']}", 'red'))
+  return False
+
+def to_rfc3339(dt: datetime) -> str:
+  """Format a datetime for the Google API, naive datetimes are treated as local time."""
+  if dt.tzinfo is None:
+    dt = dt.astimezone()
+  return dt.isoformat()
+
+def _batch_list_events(service, calendar_ids, time_min: str, time_max: str, **params):
+  """Run events().list for all calendars in one batch request, yielding (calendar_id, response)."""
+  calendar_ids = list(calendar_ids)
+  results = {}
+
+  def handle_events(request_id, response, exception):
+    results[request_id] = (response, exception)
+
+  # Send all calendar queries in a single HTTP round-trip
+  batch = service.new_batch_http_request(callback=handle_events)
+  for index, calendar_id in enumerate(calendar_ids):
+    batch.add(
+      service.events().list(
+        calendarId=calendar_id,
+        timeMin=time_min,
+        timeMax=time_max,
+        singleEvents=True,
+        **params
+      ),
+      request_id=str(index)
+    )
+  batch.execute()
+
+  for index, calendar_id in enumerate(calendar_ids):
+    response, exception = results[str(index)]
+    if exception:
+      raise exception
+    yield calendar_id, response
+
+def fetch_calendar_events(service, calendar_ids, start_date: datetime, end_date: datetime):
+  """Fetch events from all calendars in one batch request, yielding (calendar_id, events)."""
+  params = {
+    'orderBy': 'startTime',
+    'showDeleted': False,
+    'maxResults': 250,
+    # Only request the event fields the sync actually reads
+    'fields': 'nextPageToken,items(id,summary,start(date,dateTime),end(date,dateTime),attendees(self,responseStatus))'
+  }
+  # Same time range for every calendar and page, format it only once
+  time_min = to_rfc3339(start_date)
+  time_max = to_rfc3339(end_date)
+
+  responses = _batch_list_events(service, calendar_ids, time_min, time_max, **params)
+  for calendar_id, response in responses:
+    events = response.get('items', [])
+
+    # Fetch remaining pages for busy calendars one by one
+    page_token = response.get('nextPageToken')
+    while page_token:
+      response = service.events().list(
+        calendarId=calendar_id,
+        timeMin=time_min,
+        timeMax=time_max,
+        singleEvents=True,
+        pageToken=page_token,
+        **params
+      ).execute()
+      events.extend(response.get('items', []))
+      page_token = response.get('nextPageToken')
+
+    yield calendar_id, events
+
+def load_calendar_sync_state() -> Dict[str, Dict]:
+  """Load the last seen modification time of each calendar."""
+  state_file = os.path.join(os.path.dirname(__file__), 'calendar_sync_state.json')
+  try:
+    with open(state_file, 'rb') as f:
+      return orjson.loads(f.read())
+  except (OSError, orjson.JSONDecodeError):
+    return {}
+
+def save_calendar_sync_state(state: Dict[str, Dict]):
+  """Save the last seen modification time of each calendar."""
+  state_file = os.path.join(os.path.dirname(__file__), 'calendar_sync_state.json')
+  try:
+    tmp_file = state_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+      f.write(orjson.dumps(state))
+    os.replace(tmp_file, state_file)
+  except OSError as e:
+    print(colored(f"Error saving calendar sync state: {e}", 'red'))
+
+def get_changed_calendars(service, calendar_ids, start_date: datetime, end_date: datetime, state: Dict[str, Dict]) -> Dict[str, Dict]:
+  """Return the new sync state of calendars that changed since the last sync."""
+  # Only ask for the calendar modification time, not the events
+  responses = _batch_list_events(service, calendar_ids, to_rfc3339(start_date), to_rfc3339(end_date), maxResults=1, fields='updated')
+
+  changed = {}
+  for calendar_id, response in responses:
+    calendar_state = {
+      'updated': response.get('updated'),
+      'time_min': start_date.isoformat(),
+      'time_max': end_date.isoformat()
+    }
+    if state.get(calendar_id) == calendar_state:
+      log_info(f"Calendar {calendar_id} has not changed since last sync, skipping")
+    else:
+      changed[calendar_id] = calendar_state
+  return changed
+
+def _self_declined(attendees) -> bool:
+  """Check if the calendar owner has declined the event."""
+  for attendee in attendees:
+    if attendee.get('self'):
+      # Only one attendee can be self
+      return attendee.get('responseStatus') == 'declined'
+  return False
+
+def _should_skip(event: Dict, already_synced=frozenset()) -> Optional[str]:
+  """Return the reason to skip a calendar event, or None if it should be synced."""
+  # Cheapest checks first
+  start = event['start']
+  if 'date' in start:
+    return "full-day event"
+
+  if already_synced:
+    # dateTime is RFC 3339, the first 10 characters are YYYY-MM-DD
+    event_date = start['dateTime'][:10]
+    if (event['id'], event_date) in already_synced:
+      return "already synced event"
+
+  if _self_declined(event.get('attendees', ())):
+    return "declined event"
+
+  return None
 
 def sync_google_calendar_to_todoist(days: int = None, start_date: str = None, dry_run: bool = False):
   """Sync Google Calendar events to Todoist."""
   log_info("Syncing Google Calendar events to Todoist...")
 
-  # Get project IDs
-  work_project_id = get_todoist_project_id(os.getenv('TODOIST_WORK_PROJECT', 'todo'))
-  personal_project_id = get_todoist_project_id(os.getenv('TODOIST_PERSONAL_PROJECT', 'todo'))
+  # Get project IDs from the cached project list
+  work_project_id = get_todoist_project_id(TODOIST_WORK_PROJECT)
+  personal_project_id = get_todoist_project_id(TODOIST_PERSONAL_PROJECT)
 
-  # Get sync days from env or use default
+  # Use configured sync days by default
   if days is None:
-    days = int(os.getenv('GOOGLE_CALENDAR_SYNC_DAYS', '1'))
+    days = int(GOOGLE_CALENDAR_SYNC_DAYS)
 
-  # Refresh Google token
-  access_token = refresh_google_token()
-
-  # Build Google Calendar service
-  creds = Credentials(
-    token=access_token,
-    refresh_token=os.getenv('GOOGLE_REFRESH_TOKEN'),
-    client_id=os.getenv('GOOGLE_CLIENT_ID'),
-    client_secret=os.getenv('GOOGLE_CLIENT_SECRET'),
-    token_uri='https://oauth2.googleapis.com/token'
-  )
-  service = build('calendar', 'v3', credentials=creds)
+  service = _get_calendar_service()
 
   # Set time range
   if not start_date:
@@ -825,82 +1061,99 @@ def sync_google_calendar_to_todoist(days: int = None, start_date: str = None, dr
   end_date = start_date + timedelta(days=days)
 
   calendars = {
-    os.getenv('WORK_CALENDAR_ID'): work_project_id,
-    os.getenv('FAMILY_CALENDAR_ID'): personal_project_id
+    WORK_CALENDAR_ID: work_project_id,
+    FAMILY_CALENDAR_ID: personal_project_id
   }
 
-  for calendar_id, project_id in calendars.items():
-    events_result = service.events().list(
-      calendarId=calendar_id,
-      timeMin=start_date.isoformat() + 'Z',
-      timeMax=end_date.isoformat() + 'Z',
-      singleEvents=True,
-      orderBy='startTime'
-    ).execute()
+  # Skip calendars that haven't changed since the previous sync of the same time range
+  sync_state = load_calendar_sync_state()
+  changed_calendars = get_changed_calendars(service, calendars, start_date, end_date, sync_state)
+  if not changed_calendars:
+    return
+
+  # Load already synced events and current tasks once for the whole loop
+  synced_keys = load_synced_event_keys(start_date.strftime('%Y-%m-%d'))
+  try:
+    tasks_by_date = build_tasks_by_date(get_all_tasks())
+  except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+    print(colored(f"Error fetching Todoist tasks: {e}", 'red'))
+    return
 
-    events = events_result.get('items', [])
+  # Decide which tasks to create one event at a time, so duplicates are caught
+  planned = []
+  for calendar_id, events in fetch_calendar_events(service, changed_calendars, start_date, end_date):
+    project_id = calendars[calendar_id]
     log_info(f"Found {len(events)} events in calendar")
 
     for event in events:
-      # Skip declined events
-      attendees = event.get('attendees', [])
-      if any(a.get('self', False) and a.get('responseStatus') == 'declined' for a in attendees):
-        log_info(f"Skipping declined event: {event['summary']}")
+      skip_reason = _should_skip(event, synced_keys)
+      if skip_reason:
+        log_info(f"Skipping {skip_reason}: {event['summary']}")
         continue
 
-      # Skip full-day events
-      if 'date' in event['start']:
-        log_info(f"Skipping full-day event: {event['summary']}")
-        continue
-
-      # Get event's actual date
-      event_date = datetime.fromisoformat(
-        event['start']['dateTime'].replace('Z', '+00:00')
-      ).strftime('%Y-%m-%d')
-
-      # Skip if event was already synced
-      if task_exists_in_todoist(event['id'], event['summary'], event_date):
-        log_info(f"Skipping already synced event: {event['summary']}")
-        continue
-
-      create_todoist_task(event, project_id, dry_run=dry_run)
+      task = _plan_todoist_task(event, project_id, tasks_by_date)
+      if task is not None:
+        planned.append((calendar_id, event, task))
+      # Skip the same event if it's also in the other calendar
+      synced_keys.add((event['id'], event['start']['dateTime'][:10]))
 
-def check_todoist_api() -> bool:
-  """Check if Todoist API is responding correctly."""
-  api_key = os.getenv('TODOIST_API_KEY')
-  headers = {"Authorization": f"Bearer {api_key}"}
+  # Create the tasks in parallel over the shared session, a dry run only prints them
+  failed_calendars = set()
+  if planned:
+    def post(plan):
+      return _post_todoist_task(plan[1], plan[2], dry_run=dry_run)
 
+    if dry_run:
+      results = [post(plan) for plan in planned]
+    else:
+      with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(post, planned))
+      # New tasks exist now, fetch all tasks again on next lookup
+      _invalidate_tasks_cache()
+    for (calendar_id, _, _), created in zip(planned, results):
+      if not created:
+        failed_calendars.add(calendar_id)
+
+  # Only remember a calendar as synced if no event needs to be retried
+  for calendar_id in changed_calendars:
+    if calendar_id not in failed_calendars:
+      sync_state[calendar_id] = changed_calendars[calendar_id]
+
+  flush_synced_events()
+  save_calendar_sync_state(sync_state)
+
+def check_todoist_api() -> Optional[List[Dict]]:
+  """Check if Todoist API is responding correctly, returns the projects or None on failure."""
   try:
     log_info("Checking Todoist API status...")
-    response = requests.get(
-      "https://api.todoist.com/rest/v2/projects",
-      headers=headers
-    )
-    response.raise_for_status()
-    return True
-  except requests.exceptions.RequestException as e:
+    # Fetching projects doubles as the status check, the response is reused later
+    return _fetch_all_projects()
+  except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
     print(colored(f"Todoist API is not responding correctly: {e}", 'red'))
-    return False
+    return None
 
 def check_sync_disabled(note_path: str) -> bool:
   """Check if sync is disabled in the note."""
   try:
     if os.path.exists(note_path):
       with open(note_path, 'r', encoding='utf-8') as f:
-        content = f.readlines()
-        for line in content:
+        for line in f:
           if line.startswith('>'):  # Skip blockquote lines
             continue
-          if "Synkronointi lopetettu" in line:
+          if SYNC_DISABLED_MARKER in line:
             log_info("Sync disabled in note - skipping sync")
             return True
   except FileNotFoundError:
     pass  # Note doesn't exist yet
   return False
 
+# Instructions shown at the top of every daily note
+NOTE_TO_SELF = """> [!NOTE] Note to self: Ajo-ohje itselleni
+> Tehtävät tulevat Todoistista, mutta niitä voi täällä aikatauluttaa kalenteriin kätevästi Day Plannerin avulla. Lisää tähän noteen viesti "Synkronointi lopetettu klo xx:xx" jos haluat, että muutoksia ei tuoda enää Todoistista."""
+
 def create_daily_note(dry_run: bool = False):
   # First check if Todoist API is available
-  if not check_todoist_api():
+  if check_todoist_api() is None:
     print(colored("Aborting note creation due to Todoist API issues", 'red'))
     return
 
@@ -912,18 +1165,23 @@ def create_daily_note(dry_run: bool = False):
   weekday = now.strftime("%A").lower()
 
   # Get base path from environment variable
-  base_path = os.getenv('OBSIDIAN_DAILY_NOTES_PATH')
+  base_path = OBSIDIAN_DAILY_NOTES_PATH
   if not base_path:
     raise ValueError("OBSIDIAN_DAILY_NOTES_PATH not set in .env file")
 
   full_path = f"{base_path}/{year}/{month}/{day}, {weekday}.md"
 
+  # Create directory structure if it doesn't exist
+  os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
   # Check for sync stop message before doing any syncing
   if check_sync_disabled(full_path):
     return
 
   try:
-    sync_google_calendar_to_todoist(dry_run=dry_run)
+    # Start the calendar sync from the same clock reading as the note
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    sync_google_calendar_to_todoist(start_date=today_start.isoformat(), dry_run=dry_run)
   except Exception as e:
     print(colored(f"Error syncing calendar events: {e}", 'red'))
 
@@ -936,223 +1194,194 @@ def create_daily_note(dry_run: bool = False):
   tasks = get_todoist_tasks()
 
   # Sync tasks with Todoist and update our tasks list with any changes
-  sync_tasks_with_todoist(existing_tasks, tasks, full_path)
+  changed = sync_tasks_with_todoist(existing_tasks, tasks, full_path)
 
-  # Get fresh task list after sync to include completion status changes
-  tasks = get_todoist_tasks()
+  # Get today's tasks again only if the sync changed completion status in Todoist
+  if changed:
+    tasks = get_todoist_tasks()
 
-  task_count = len(tasks)
-  formatted_tasks = format_todoist_tasks(tasks, is_today=True)
-
-  # Format tasks section
-  tasks_section = ""
-  if task_count > 0:
-    tasks_section = f"\n## Tehtävät\n{formatted_tasks}\n"
-
-  # Format backlog section
+  # Backlog and future tasks are split from the same cached task list
   backlog_tasks = get_backlog_tasks()
-  backlog_count = len(backlog_tasks)
-  backlog_section = ""
-  if backlog_count > 0:
-    formatted_backlog = format_todoist_tasks(backlog_tasks, is_today=False)
-    backlog_section = f"\n## Backlog\n{formatted_backlog}\n"
-
-  # Format future tasks section
   future_tasks = get_future_tasks()
-  future_count = len(future_tasks)
-  future_section = ""
-  if future_count > 0:
-    formatted_future = format_todoist_tasks(future_tasks, is_today=False)
-    future_section = f"\n## Tulevat tehtävät\n{formatted_future}\n"
 
   # Format weekday and month names for the header
   weekday_capitalized = weekday.capitalize()
   month_name = now.strftime("%B")
 
   # Update sync time message to use 24-hour format
-  sync_time = datetime.now().strftime('%H:%M')
+  sync_time = now.strftime('%H:%M')
   sync_message = f"Synkronoitu viimeksi klo {sync_time}."
 
-  # Create the content
-  content = f"""# {weekday_capitalized}, {now.day}. {month_name}ta
-
-{sync_message}
-
-> [!NOTE] Note to self: Ajo-ohje itselleni
-> Tehtävät tulevat Todoistista, mutta niitä voi täällä aikatauluttaa kalenteriin kätevästi Day Plannerin avulla. Lisää tähän noteen viesti "Synkronointi lopetettu klo xx:xx" jos haluat, että muutoksia ei tuoda enää Todoistista.
-
-## Päivän tehtävät
-
-{formatted_tasks}
-
-## Myöhemmin
-
-{formatted_future}
-
-## Backlog
-
-{formatted_backlog}"""
-
-  # Create directory structure if it doesn't exist
-  os.makedirs(os.path.dirname(full_path), exist_ok=True)
-
-  # Write the content to file
-  with open(full_path, 'w', encoding='utf-8') as f:
-    f.write(content)
+  # Collect the note parts, today's section is always shown (with "0 tehtävää tänään."
+  # when empty) but empty future and backlog sections are left out
+  parts = [
+    f"# {weekday_capitalized}, {now.day}. {month_name}ta",
+    sync_message,
+    NOTE_TO_SELF,
+    f"## Päivän tehtävät\n\n{format_todoist_tasks(tasks, is_today=True)}"
+  ]
+  if future_tasks:
+    parts.append(f"## Myöhemmin\n\n{format_todoist_tasks(future_tasks, is_today=False)}")
+  if backlog_tasks:
+    parts.append(f"## Backlog\n\n{format_todoist_tasks(backlog_tasks, is_today=False)}")
+
+  # Write the note to a temporary file, then swap it in
+  # so an interrupted run never leaves a half-written note behind
+  tmp_path = full_path + '.tmp'
+  with open(tmp_path, 'w', encoding='utf-8', buffering=1 << 20) as f:
+    f.write("\n\n".join(parts))
+  os.replace(tmp_path, full_path)
 
   print(f"Daily note created at: {full_path}")
 
 def get_todoist_project_id(project_name: str) -> str:
   """Get Todoist project ID by name."""
-  api_key = os.getenv('TODOIST_API_KEY')
-  if not api_key:
+  if not TODOIST_API_KEY:
     raise ValueError("TODOIST_API_KEY not set in .env file")
 
-  headers = {
-    "Authorization": f"Bearer {api_key}"
-  }
-
   try:
-    response = requests.get(
-      "https://api.todoist.com/rest/v2/projects",
-      headers=headers
-    )
-    response.raise_for_status()
-    projects = response.json()
-    for project in projects:
-      if project['name'] == project_name:
-        return project['id']
+    project_ids = _project_ids_by_name()
+    if project_name in project_ids:
+      return project_ids[project_name]
     raise ValueError(f"Project {project_name} not found in Todoist")
-  except requests.exceptions.RequestException as e:
+  except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
     print(colored(f"Error fetching projects: {e}", 'red'))
     return None
 
-def get_completed_tasks(headers: Dict) -> List[Dict]:
+def get_completed_tasks() -> List[Dict]:
   log_info("Fetching completed tasks...")
   try:
+    # Only ask for tasks completed today (UTC), the API allows at most 200 per request
+    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    today = today_start.strftime("%Y-%m-%d")
+
     # First get completed tasks from sync API
-    response = requests.get(
+    response = TODOIST_SESSION.get(
       "https://api.todoist.com/sync/v9/completed/get_all",
-      headers=headers
+      params={
+        "since": today_start.strftime("%Y-%m-%dT%H:%M:%S"),
+        "until": (today_start + timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%S"),
+        "limit": 200
+      }
     )
     response.raise_for_status()
-    completed_data = response.json()
+    completed_data = orjson.loads(response.content)
 
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     completed_tasks = []
 
     # Get all tasks to find subtasks
-    all_response = requests.get(
-      "https://api.todoist.com/rest/v2/tasks",
-      headers=headers
-    )
-    all_response.raise_for_status()
-    all_tasks = all_response.json()
-
-    # For each completed task, fetch its original data and subtasks
-    for item in completed_data.get("items", []):
-      completed_at = item.get("completed_at", "")
-      if completed_at.startswith(today):
-        # Try to get original task data
-        task_response = requests.get(
-          f"https://api.todoist.com/rest/v2/tasks/{item['task_id']}",
-          headers=headers
-        )
+    all_tasks = get_all_tasks()
 
-        log_info(f"Original task response status: {task_response.status_code}")
+    # Only tasks completed today
+    items = [
+      item for item in completed_data.get("items", [])
+      if item.get("completed_at", "").startswith(today)
+    ]
+
+    # Index active tasks and their subtasks once
+    tasks_by_id = {}
+    child_tasks = {}
+    for task in all_tasks:
+      tasks_by_id[task['id']] = task
+      if task['parent_id']:
+        child_tasks.setdefault(task['parent_id'], []).append(task)
+
+    # Fetch original data only for tasks that aren't active anymore, in parallel
+    missing_ids = [str(item['task_id']) for item in items if str(item['task_id']) not in tasks_by_id]
+    task_responses = {}
+    if missing_ids:
+      with ThreadPoolExecutor(max_workers=4) as executor:
+        responses = executor.map(
+          lambda task_id: TODOIST_SESSION.get(f"https://api.todoist.com/rest/v2/tasks/{task_id}"),
+          missing_ids
+        )
+        task_responses = dict(zip(missing_ids, responses))
+
+    # For each completed task, use its original data and add subtasks
+    for item in items:
+      task_id = str(item['task_id'])
+      task_data = tasks_by_id.get(task_id)
+      if task_data is None:
+        task_response = task_responses[task_id]
+        log_debug("Original task response status: %s", task_response.status_code)
         if task_response.status_code == 200:
-          task_data = task_response.json()
-          log_info(f"Original task data: {task_data}")
-          task_data['completed'] = True
-          completed_tasks.append(task_data)
-
-          # Find and add any completed subtasks
-          for subtask in all_tasks:
-            if str(subtask.get('parent_id')) == str(item['task_id']):
-              subtask['completed'] = True
-              completed_tasks.append(subtask)
-              log_info(f"Added completed subtask: {subtask['content']}")
-        else:
-          log_info(f"Fallback: Using basic task data for {item['content']}")
-          # Fallback to basic task data if original not available
-          completed_tasks.append({
-            "content": item["content"],
-            "completed": True,
-            "priority": item.get("priority", 1),
-            "project_id": item.get("project_id"),
-            "parent_id": item.get("parent_id"),
-            "id": item.get("task_id")
-          })
+          task_data = normalize_task_ids([orjson.loads(task_response.content)])[0]
+
+      if task_data is not None:
+        log_debug("Original task data: %s", task_data)
+        task_data['completed'] = True
+        completed_tasks.append(task_data)
+
+        # Add any completed subtasks
+        for subtask in child_tasks.get(task_id, ()):
+          subtask['completed'] = True
+          completed_tasks.append(subtask)
+          log_debug("Added completed subtask: %s", subtask['content'])
+      else:
+        log_debug("Fallback: Using basic task data for %s", item['content'])
+        # Fallback to basic task data if original not available
+        completed_tasks.append({
+          "content": item["content"],
+          "completed": True,
+          "priority": item.get("priority", 1),
+          "project_id": item.get("project_id"),
+          "parent_id": str(item["parent_id"]) if item.get("parent_id") else None,
+          "id": task_id
+        })
 
     return completed_tasks
-  except requests.exceptions.RequestException as e:
+  except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
     print(colored(f"Error fetching completed tasks: {e}", 'red'))
     return []
 
 def dummy_sync_google_calendar(days: int = 30):
-  """Populate synced_events.log with existing events without creating Todoist tasks."""
-  log_info("Starting dummy sync to populate synced_events.log...")
+  """Populate the synced events database with existing events without creating Todoist tasks."""
+  log_info("Starting dummy sync to populate synced events...")
 
-  # Refresh Google token
-  access_token = refresh_google_token()
-
-  # Build Google Calendar service
-  creds = Credentials(
-    token=access_token,
-    refresh_token=os.getenv('GOOGLE_REFRESH_TOKEN'),
-    client_id=os.getenv('GOOGLE_CLIENT_ID'),
-    client_secret=os.getenv('GOOGLE_CLIENT_SECRET'),
-    token_uri='https://oauth2.googleapis.com/token'
-  )
-  service = build('calendar', 'v3', credentials=creds)
+  service = _get_calendar_service()
 
   # Set time range (past 30 days by default)
   end_date = datetime.now(timezone.utc)
   start_date = end_date - timedelta(days=days)
 
   calendars = {
-    os.getenv('WORK_CALENDAR_ID'): os.getenv('TODOIST_WORK_PROJECT', 'todo'),
-    os.getenv('FAMILY_CALENDAR_ID'): os.getenv('TODOIST_PERSONAL_PROJECT', 'todo')
+    WORK_CALENDAR_ID: TODOIST_WORK_PROJECT,
+    FAMILY_CALENDAR_ID: TODOIST_PERSONAL_PROJECT
   }
 
   total_events = 0
-  for calendar_id, project_name in calendars.items():
-    events_result = service.events().list(
-      calendarId=calendar_id,
-      timeMin=start_date.isoformat() + 'Z',
-      timeMax=end_date.isoformat() + 'Z',
-      singleEvents=True,
-      orderBy='startTime'
-    ).execute()
-
-    events = events_result.get('items', [])
+  for calendar_id, events in fetch_calendar_events(service, calendars, start_date, end_date):
     log_info(f"Found {len(events)} events in calendar {calendar_id}")
 
     for event in events:
-      # Skip declined events
-      attendees = event.get('attendees', [])
-      if any(a.get('self', False) and a.get('responseStatus') == 'declined' for a in attendees):
+      # Skip full-day and declined events
+      if _should_skip(event):
         continue
 
-      # Skip full-day events
-      if 'date' in event['start']:
-        continue
-
-      # Get event's actual date
-      event_date = datetime.fromisoformat(
-        event['start']['dateTime'].replace('Z', '+00:00')
-      ).strftime('%Y-%m-%d')
+      # dateTime is RFC 3339, the first 10 characters are YYYY-MM-DD
+      event_date = event['start']['dateTime'][:10]
 
-      # Save to log file without creating Todoist task
+      # Save as synced without creating Todoist task
       save_synced_event(event['id'], event['summary'], event_date)
       total_events += 1
 
-  log_info(f"Dummy sync complete. Added {total_events} events to synced_events.log")
+  flush_synced_events()
+  log_info(f"Dummy sync complete. Added {total_events} events to synced events")
 
 if __name__ == "__main__":
   # Add command line argument handling
   parser = argparse.ArgumentParser()
-  parser.add_argument("--dry-run", action="store_true", help="Don't create tasks in Todoist, just populate the log file")
+  parser.add_argument("--dry-run", action="store_true", help="Don't create tasks in Todoist, just mark events as synced")
+  parser.add_argument("--verbose", action="store_true", help="Show detailed per-task debug logging")
   args = parser.parse_args()
 
+  if args.verbose:
+    logger.setLevel(logging.DEBUG)
+
+  # Stop right away if required settings are missing
+  missing_settings = [name for name, value in REQUIRED_SETTINGS.items() if not value]
+  if missing_settings:
+    print(colored(f"Missing required settings in .env file: {', '.join(missing_settings)}", 'red'))
+    sys.exit(1)
+
   create_daily_note(dry_run=args.dry_run)